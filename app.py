@@ -1,8 +1,10 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 # =====================================================
 # KONFIGURASI APLIKASI
@@ -14,6 +16,9 @@ st.set_page_config(
 )
 
 DATA_FILE = "data_kuesioner.xlsx"
+MAKS_BARIS_TABEL = 1000  # Batas baris yang dikirim ke st.dataframe per rerun
+MAKS_ENTRI_CACHE = 32  # Batas entri per fungsi cache (tiap kombinasi pertanyaan = 1 entri)
+VERSI_CACHE = 2  # Naikkan jika isi hasil baca_excel() berubah agar cache Parquet lama tidak dipakai
 
 # =====================================================
 # FUNGSI BANTU (HELPER FUNCTIONS)
@@ -39,38 +44,350 @@ COLOR_MAP = {
     "TS": "#EF553B",   # Merah Muda
     "STS": "#B42020"   # Merah Tua
 }
+COLOR_SENTIMEN = {'Positif': '#28B463', 'Netral': '#808B96', 'Negatif': '#C0392B'}
 
 # =====================================================
 # MEMUAT DATA (DATA LOADING)
 # =====================================================
+def kolom_jawaban(nama):
+    """Filter usecols: semua kolom kecuali Partisipan"""
+    return nama != 'Partisipan'
+
+def baca_excel():
+    """
+    Membaca sheet Kuesioner dari file Excel (calamine lebih cepat, openpyxl sebagai cadangan).
+    Kolom Partisipan tidak ikut dimasukkan ke DataFrame.
+    """
+    try:
+        return pd.read_excel(DATA_FILE, sheet_name="Kuesioner", engine="calamine", usecols=kolom_jawaban)
+    except ImportError:
+        return pd.read_excel(DATA_FILE, sheet_name="Kuesioner", engine="openpyxl", usecols=kolom_jawaban)
+
+def baca_data_cache():
+    """
+    Membaca data dari cache Parquet yang dikunci dengan hash file Excel.
+    Jika cache belum ada/kedaluwarsa, baca Excel lalu tulis ulang cache-nya.
+    """
+    with open(DATA_FILE, "rb") as f:
+        kode_hash = hashlib.sha256(f.read() + f"v{VERSI_CACHE}".encode()).hexdigest()[:16]
+
+    basis, _ = os.path.splitext(DATA_FILE)
+    cache_file = f"{basis}.{kode_hash}.parquet"
+
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_parquet(cache_file)
+        except Exception:
+            pass
+
+    df = baca_excel()
+
+    # Hapus cache lama yang hash-nya sudah tidak cocok
+    for file_lama in glob.glob(f"{glob.escape(basis)}.*.parquet"):
+        if file_lama != cache_file:
+            try:
+                os.remove(file_lama)
+            except OSError:
+                pass
+
+    # Cache hanya optimasi: kegagalan apa pun (pyarrow tidak ada, folder read-only,
+    # kolom bertipe campuran) tidak boleh menghalangi pemuatan data
+    try:
+        df.to_parquet(cache_file, engine="pyarrow", compression="zstd")
+    except Exception:
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+
+    return df
+
 @st.cache_data
 def muat_data():
     """
-    Memuat dan mempersiapkan data dari file Excel Kuesioner
+    Memuat dan mempersiapkan data dari file Excel Kuesioner.
+    Semua perhitungan memakai matriks kode int8 (responden x pertanyaan):
+    0..5 mengikuti URUTAN_SKALA (SS..STS), -1 untuk jawaban kosong/tidak valid.
+    DataFrame mentah tetap dikembalikan untuk tabel & download agar jawaban
+    yang tidak valid tetap terlihat apa adanya.
     """
     try:
         # Load Data
-        df = pd.read_excel(DATA_FILE, sheet_name="Kuesioner", engine="openpyxl")
+        df = baca_data_cache()
         
-        # Hapus kolom Partisipan jika ada
-        if 'Partisipan' in df.columns:
-            df = df.drop(columns=['Partisipan'])
-            
-        # Buat dataframe versi numerik untuk perhitungan skor
-        df_numeric = df.replace(SKOR_MAP)
+        # get_indexer memberi -1 untuk jawaban di luar skala tanpa peringatan/error
+        skala_index = pd.Index(URUTAN_SKALA)
+        codes = np.column_stack([
+            skala_index.get_indexer(df[c]) for c in df.columns
+        ]).astype(np.int8)
         
-        return df, df_numeric
+        return df, codes
     except Exception as e:
         st.error(f"❌ Gagal memuat data: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame(), np.empty((0, 0), dtype=np.int8)
 
-df, df_numeric = muat_data()
+df, codes = muat_data()
+pertanyaan = df.columns.tolist()
 
 # Validasi data
-if df.empty:
+if codes.size == 0:
     st.error("❌ Data tidak ditemukan atau file kosong. Pastikan 'data_kuesioner.xlsx' ada di folder yang sama.")
     st.stop()
 
+# =====================================================
+# AGREGASI DATA (DI-CACHE PER PILIHAN PERTANYAAN)
+# =====================================================
+# Skor numerik tiap kode (SS=6 ... STS=1)
+SKOR_PER_KODE = np.array([SKOR_MAP[s] for s in URUTAN_SKALA], dtype=np.float32)
+
+def kode_ke_skor(kode):
+    """Ubah matriks kode menjadi matriks skor float32 (NaN untuk jawaban kosong)"""
+    return np.where(kode >= 0, SKOR_PER_KODE[kode], np.nan).astype(np.float32)
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_bucket_counts(kode):
+    """
+    Tabel jumlah jawaban (pertanyaan x skala) dalam satu kali bincount.
+    Kode tiap kolom digeser j*6 sehingga semua kolom dihitung sekaligus.
+    """
+    n_skala = len(URUTAN_SKALA)
+    n_q = kode.shape[1]
+    geser = kode.astype(np.intp) + np.arange(n_q) * n_skala
+    counts = np.bincount(geser[kode >= 0], minlength=n_q * n_skala)
+    return counts.reshape(n_q, n_skala)
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_rata_rata_global(kode):
+    """Rata-rata skor seluruh sel untuk pertanyaan terpilih"""
+    return np.nanmean(kode_ke_skor(kode))
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_mean_per_q(kode, kolom):
+    """Rata-rata skor per pertanyaan"""
+    return pd.Series(np.nanmean(kode_ke_skor(kode), axis=0), index=list(kolom))
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_distribusi_global(kode):
+    """Frekuensi tiap skala jawaban dari seluruh pertanyaan terpilih"""
+    counts = hitung_bucket_counts(kode).sum(axis=0)
+    return pd.DataFrame({"Skala": URUTAN_SKALA, "Jumlah": counts})
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_q_counts(kode, kolom):
+    """Jumlah tiap skala jawaban per pertanyaan"""
+    q_counts = pd.DataFrame(hitung_bucket_counts(kode), columns=URUTAN_SKALA)
+    q_counts.insert(0, 'Pertanyaan', list(kolom))
+    return q_counts
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_statistik(kode, kolom):
+    """Statistik deskriptif skor per pertanyaan"""
+    arr = kode_ke_skor(kode)
+    q = np.nanpercentile(arr, [25, 50, 75], axis=0)
+    stats_df = pd.DataFrame({
+        "mean": np.nanmean(arr, axis=0),
+        "std": np.nanstd(arr, axis=0, ddof=1),
+        "min": np.nanmin(arr, axis=0),
+        "max": np.nanmax(arr, axis=0),
+        "25%": q[0],
+        "50%": q[1],
+        "75%": q[2]
+    }, index=list(kolom))
+    return stats_df.sort_values("mean", ascending=False)
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def hitung_sentimen(kode, kolom):
+    """Jumlah dan persentase sentimen per pertanyaan"""
+    # Positif: SS & S (kode 0-1), Netral: CS (kode 2), Negatif: CTS, TS & STS (kode 3-5)
+    counts = hitung_bucket_counts(kode)
+    cat_per_q = pd.DataFrame({
+        'Pertanyaan': list(kolom),
+        'Positif': counts[:, :2].sum(axis=1),
+        'Netral': counts[:, 2],
+        'Negatif': counts[:, 3:].sum(axis=1)
+    })
+
+    # Normalize to percentage
+    cat_per_q['Total'] = cat_per_q['Positif'] + cat_per_q['Netral'] + cat_per_q['Negatif']
+    cat_per_q['Pct_Positif'] = (cat_per_q['Positif'] / cat_per_q['Total']) * 100
+    cat_per_q['Pct_Netral'] = (cat_per_q['Netral'] / cat_per_q['Total']) * 100
+    cat_per_q['Pct_Negatif'] = (cat_per_q['Negatif'] / cat_per_q['Total']) * 100
+    return cat_per_q
+
+def ambil_agregat(kode, kolom):
+    """
+    Ambil entri agregat milik sesi dari st.session_state, dikunci hash isi matriks kode.
+    Hanya satu entri disimpan per sesi; entri lama dibuang saat pilihan berubah.
+    Isinya diisi bertahap lewat dari_sesi() oleh menu yang membutuhkannya.
+    """
+    kunci = hashlib.blake2b(
+        kode.tobytes() + repr((kode.shape, kolom)).encode(), digest_size=8
+    ).hexdigest()
+    nama = f"agg_{kunci}"
+
+    if nama not in st.session_state:
+        for lama in [k for k in st.session_state.keys() if str(k).startswith("agg_")]:
+            del st.session_state[lama]
+        st.session_state[nama] = {}
+    return st.session_state[nama]
+
+def dari_sesi(entri, nama, fungsi, *args):
+    """
+    Ambil hasil fungsi(*args) dari entri sesi; hanya dihitung saat pertama diminta.
+    Rerun berikutnya langsung memakai objek tersimpan tanpa hashing argumen.
+    """
+    if nama not in entri:
+        entri[nama] = fungsi(*args)
+    return entri[nama]
+
+@st.cache_data(max_entries=MAKS_ENTRI_CACHE)
+def buat_csv(df_src, kolom):
+    """Isi file CSV untuk tombol download"""
+    return df_src[list(kolom)].to_csv(index=False).encode('utf-8')
+
+# =====================================================
+# PEMBUAT GRAFIK (OBJEK FIGURE DI-CACHE)
+# =====================================================
+# Plotly di-import di dalam fungsi agar menu tanpa grafik tidak ikut memuatnya
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_distribusi(dist_global):
+    """Bar chart frekuensi jawaban keseluruhan"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Bar(
+        x=dist_global["Skala"],
+        y=dist_global["Jumlah"],
+        marker_color=[COLOR_MAP[s] for s in dist_global["Skala"]],
+        texttemplate="%{y}"
+    ))
+    fig.update_layout(
+        title="Frekuensi Jawaban (Semua Pertanyaan)",
+        xaxis_title="Skala",
+        yaxis_title="Jumlah",
+        height=400,
+        showlegend=False
+    )
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_proporsi(dist_global):
+    """Donut chart proporsi jawaban keseluruhan"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Pie(
+        labels=dist_global["Skala"],
+        values=dist_global["Jumlah"],
+        marker_colors=[COLOR_MAP[s] for s in dist_global["Skala"]],
+        hole=0.4,
+        sort=False,
+        textposition='inside',
+        textinfo='percent+label'
+    ))
+    fig.update_layout(title="Persentase Pilihan Jawaban", height=400)
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_stacked(q_counts):
+    """Stacked bar distribusi jawaban per pertanyaan"""
+    import plotly.graph_objects as go
+    fig = go.Figure([
+        go.Bar(
+            name=skala,
+            x=q_counts["Pertanyaan"],
+            y=q_counts[skala],
+            marker_color=COLOR_MAP[skala],
+            texttemplate="%{y}"
+        )
+        for skala in URUTAN_SKALA
+    ])
+    fig.update_layout(
+        title="Distribusi Jawaban per Pertanyaan (Stacked)",
+        xaxis_title="Pertanyaan",
+        yaxis_title="Jumlah",
+        barmode="stack",
+        height=600,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_heatmap(q_counts):
+    """Heatmap kepadatan jawaban per pertanyaan"""
+    import plotly.graph_objects as go
+    heatmap_data = q_counts.set_index('Pertanyaan').astype('int32')
+    fig = go.Figure(go.Heatmap(
+        z=heatmap_data.values,
+        x=URUTAN_SKALA,
+        y=heatmap_data.index,
+        colorscale="Blues",
+        colorbar=dict(title="Jumlah"),
+        texttemplate="%{z}"
+    ))
+    fig.update_layout(
+        xaxis_title="Skala",
+        yaxis=dict(title="Pertanyaan", autorange="reversed"),
+        height=500
+    )
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_peringkat(avg_scores):
+    """Bar chart horizontal peringkat rata-rata skor"""
+    import plotly.express as px
+    fig = px.bar(
+        avg_scores,
+        x="Rata_rata_Skor",
+        y="Pertanyaan",
+        orientation="h",
+        color="Rata_rata_Skor",
+        color_continuous_scale="Viridis",
+        text=avg_scores["Rata_rata_Skor"].apply(format_skor),
+        range_x=[0, 7]
+    )
+    fig.update_layout(
+        title="Peringkat Rata-rata Skor per Pertanyaan",
+        xaxis_title="Skor Rata-rata (Max 6.0)",
+        yaxis_title="Pertanyaan",
+        height=600
+    )
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_sentimen(cat_per_q):
+    """Stacked bar 100% komposisi sentimen per pertanyaan"""
+    import plotly.graph_objects as go
+    fig = go.Figure([
+        go.Bar(
+            name=kategori,
+            x=cat_per_q[f'Pct_{kategori}'],
+            y=cat_per_q['Pertanyaan'],
+            orientation='h',
+            marker_color=warna,
+            text=cat_per_q[f'Pct_{kategori}'].apply(format_persen)
+        )
+        for kategori, warna in COLOR_SENTIMEN.items()
+    ])
+    fig.update_layout(
+        title="Persentase Sentimen per Pertanyaan",
+        xaxis_title="Persentase (%)",
+        yaxis_title="Pertanyaan",
+        barmode="stack",
+        height=600,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig
+
+@st.cache_resource(max_entries=MAKS_ENTRI_CACHE)
+def buat_fig_agregat(df_agregat):
+    """Bar chart total agregat sentimen"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Bar(
+        x=df_agregat['Kategori'],
+        y=df_agregat['Jumlah'],
+        marker_color=[COLOR_SENTIMEN[k] for k in df_agregat['Kategori']],
+        texttemplate="%{y}"
+    ))
+    fig.update_layout(xaxis_title="Kategori", yaxis_title="Jumlah", showlegend=False)
+    return fig
+
 # =====================================================
 # SIDEBAR (NAVIGASI)
 # =====================================================
@@ -79,7 +396,7 @@ st.sidebar.markdown("---")
 
 # Filter Pertanyaan (Opsional)
 st.sidebar.subheader("🏷️ Filter Pertanyaan")
-all_questions = df.columns.tolist()
+all_questions = list(pertanyaan)
 selected_questions = st.sidebar.multiselect(
     "Pilih pertanyaan untuk analisis detail",
     all_questions,
@@ -88,11 +405,13 @@ selected_questions = st.sidebar.multiselect(
 
 # Terapkan filter kolom jika ada yang dipilih
 if selected_questions:
-    df_display = df[selected_questions]
-    df_num_display = df_numeric[selected_questions]
+    kolom_terpilih = tuple(selected_questions)
 else:
-    df_display = df
-    df_num_display = df_numeric
+    kolom_terpilih = tuple(pertanyaan)
+
+# Matriks kode untuk pertanyaan terpilih (juga menjadi kunci cache agregasi)
+kode_terpilih = codes[:, [pertanyaan.index(q) for q in kolom_terpilih]]
+agregat = ambil_agregat(kode_terpilih, kolom_terpilih)
 
 st.sidebar.markdown("---")
 
@@ -116,12 +435,12 @@ if menu == "📊 Dashboard Utama":
     st.markdown("---")
     
     # Hitung KPI Global
-    total_responden = len(df)
-    total_sel = df_display.size
-    rata_rata_global = df_num_display.values.flatten().mean()
+    total_responden = codes.shape[0]
+    total_sel = kode_terpilih.size
+    rata_rata_global = dari_sesi(agregat, "rata_rata_global", hitung_rata_rata_global, kode_terpilih)
     
     # Mencari Pertanyaan dengan Skor Tertinggi & Terendah
-    mean_per_q = df_num_display.mean()
+    mean_per_q = dari_sesi(agregat, "mean_per_q", hitung_mean_per_q, kode_terpilih, kolom_terpilih)
     best_q = mean_per_q.idxmax()
     best_score = mean_per_q.max()
     worst_q = mean_per_q.idxmin()
@@ -166,38 +485,17 @@ if menu == "📊 Dashboard Utama":
     # Visualisasi Utama - Global Distribution
     col_a, col_b = st.columns(2)
     
-    # Data Flatten untuk distribusi global
-    all_vals = df_display.values.flatten()
-    dist_global = pd.Series(all_vals).value_counts().reindex(URUTAN_SKALA).fillna(0).reset_index()
-    dist_global.columns = ["Skala", "Jumlah"]
+    # Distribusi global
+    dist_global = dari_sesi(agregat, "dist_global", hitung_distribusi_global, kode_terpilih)
     
     with col_a:
         st.subheader("📊 Distribusi Jawaban Keseluruhan")
-        fig = px.bar(
-            dist_global,
-            x="Skala",
-            y="Jumlah",
-            color="Skala",
-            color_discrete_map=COLOR_MAP,
-            text_auto=True,
-            title="Frekuensi Jawaban (Semua Pertanyaan)"
-        )
-        fig.update_layout(height=400, showlegend=False)
+        fig = dari_sesi(agregat, "fig_distribusi", buat_fig_distribusi, dist_global)
         st.plotly_chart(fig, use_container_width=True)
     
     with col_b:
         st.subheader("🥧 Proporsi Jawaban")
-        fig = px.pie(
-            dist_global,
-            names="Skala",
-            values="Jumlah",
-            color="Skala",
-            color_discrete_map=COLOR_MAP,
-            hole=0.4,
-            title="Persentase Pilihan Jawaban"
-        )
-        fig.update_traces(textposition='inside', textinfo='percent+label')
-        fig.update_layout(height=400)
+        fig = dari_sesi(agregat, "fig_proporsi", buat_fig_proporsi, dist_global)
         st.plotly_chart(fig, use_container_width=True)
 
 # =====================================================
@@ -210,42 +508,14 @@ elif menu == "📝 Analisis per Pertanyaan":
     st.info("Grafik di bawah memperlihatkan sebaran jawaban untuk setiap pertanyaan secara detail.")
 
     # Data Processing untuk Stacked Bar
-    q_counts = df_display.apply(pd.Series.value_counts).reindex(URUTAN_SKALA).fillna(0).T.reset_index()
-    q_counts = q_counts.rename(columns={'index': 'Pertanyaan'})
-    q_melt = q_counts.melt(id_vars='Pertanyaan', var_name='Skala', value_name='Jumlah')
+    q_counts = dari_sesi(agregat, "q_counts", hitung_q_counts, kode_terpilih, kolom_terpilih)
 
-    fig = px.bar(
-        q_melt,
-        x="Pertanyaan",
-        y="Jumlah",
-        color="Skala",
-        barmode="stack",
-        category_orders={"Skala": URUTAN_SKALA},
-        color_discrete_map=COLOR_MAP,
-        text_auto=True,
-        title="Distribusi Jawaban per Pertanyaan (Stacked)"
-    )
-    
-    fig.update_layout(
-        height=600,
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
+    fig = dari_sesi(agregat, "fig_stacked", buat_fig_stacked, q_counts)
     st.plotly_chart(fig, use_container_width=True)
     
     # Heatmap Distribusi
     st.subheader("Heatmap Kepadatan Jawaban")
-    heatmap_data = q_counts.set_index('Pertanyaan')
-    
-    fig_heat = px.imshow(
-        heatmap_data,
-        labels=dict(x="Skala", y="Pertanyaan", color="Jumlah"),
-        x=URUTAN_SKALA,
-        y=heatmap_data.index,
-        color_continuous_scale="Blues",
-        aspect="auto",
-        text_auto=True
-    )
-    fig_heat.update_layout(height=500)
+    fig_heat = dari_sesi(agregat, "fig_heatmap", buat_fig_heatmap, q_counts)
     st.plotly_chart(fig_heat, use_container_width=True)
 
 # =====================================================
@@ -256,36 +526,19 @@ elif menu == "⭐ Peringkat Skor":
     st.markdown("---")
     
     # Hitung rata-rata
-    avg_scores = df_num_display.mean().reset_index()
+    avg_scores = dari_sesi(agregat, "mean_per_q", hitung_mean_per_q, kode_terpilih, kolom_terpilih).reset_index()
     avg_scores.columns = ["Pertanyaan", "Rata_rata_Skor"]
     avg_scores = avg_scores.sort_values("Rata_rata_Skor", ascending=True) # Ascending agar bar chart horizontal urut dari atas (best)
     
     tab1, tab2 = st.tabs(["📊 Bar Chart", "📉 Analisis Detail"])
     
     with tab1:
-        fig = px.bar(
-            avg_scores,
-            x="Rata_rata_Skor",
-            y="Pertanyaan",
-            orientation="h",
-            color="Rata_rata_Skor",
-            color_continuous_scale="Viridis",
-            text=avg_scores["Rata_rata_Skor"].apply(format_skor),
-            range_x=[0, 7]
-        )
-        
-        fig.update_layout(
-            title="Peringkat Rata-rata Skor per Pertanyaan",
-            xaxis_title="Skor Rata-rata (Max 6.0)",
-            yaxis_title="Pertanyaan",
-            height=600
-        )
+        fig = dari_sesi(agregat, "fig_peringkat", buat_fig_peringkat, avg_scores)
         st.plotly_chart(fig, use_container_width=True)
         
     with tab2:
         st.subheader("Detail Statistik Skor")
-        stats_df = df_num_display.describe().T[["mean", "std", "min", "max", "25%", "50%", "75%"]]
-        stats_df = stats_df.sort_values("mean", ascending=False)
+        stats_df = dari_sesi(agregat, "statistik", hitung_statistik, kode_terpilih, kolom_terpilih)
         st.dataframe(stats_df.style.background_gradient(cmap="Greens", subset=["mean"]), use_container_width=True)
 
 # =====================================================
@@ -303,51 +556,12 @@ elif menu == "🎭 Analisis Sentimen/Kategori":
     """)
     
     # Hitung per Pertanyaan
-    def hitung_kategori(row):
-        pos = (row == 'SS').sum() + (row == 'S').sum()
-        neu = (row == 'CS').sum()
-        neg = (row == 'CTS').sum() + (row == 'TS').sum() + (row == 'STS').sum()
-        return pd.Series([pos, neu, neg], index=['Positif', 'Netral', 'Negatif'])
-
-    cat_per_q = df_display.apply(hitung_kategori, axis=0).T.reset_index().rename(columns={'index': 'Pertanyaan'})
+    cat_per_q = dari_sesi(agregat, "sentimen", hitung_sentimen, kode_terpilih, kolom_terpilih)
     
     # Chart 1: Stacked Bar 100%
     st.subheader("Komposisi Sentimen per Pertanyaan")
     
-    # Normalize to percentage
-    cat_per_q['Total'] = cat_per_q['Positif'] + cat_per_q['Netral'] + cat_per_q['Negatif']
-    cat_per_q['Pct_Positif'] = (cat_per_q['Positif'] / cat_per_q['Total']) * 100
-    cat_per_q['Pct_Netral'] = (cat_per_q['Netral'] / cat_per_q['Total']) * 100
-    cat_per_q['Pct_Negatif'] = (cat_per_q['Negatif'] / cat_per_q['Total']) * 100
-    
-    cat_melt = cat_per_q.melt(
-        id_vars=['Pertanyaan', 'Total', 'Positif', 'Netral', 'Negatif'], 
-        value_vars=['Pct_Positif', 'Pct_Netral', 'Pct_Negatif'],
-        var_name='Kategori_Pct', value_name='Persentase'
-    )
-    
-    # Mapping nama kategori agar bersih di legenda
-    cat_map_name = {'Pct_Positif': 'Positif', 'Pct_Netral': 'Netral', 'Pct_Negatif': 'Negatif'}
-    cat_melt['Kategori'] = cat_melt['Kategori_Pct'].map(cat_map_name)
-    
-    color_sentimen = {'Positif': '#28B463', 'Netral': '#808B96', 'Negatif': '#C0392B'}
-
-    fig = px.bar(
-        cat_melt,
-        x="Persentase",
-        y="Pertanyaan",
-        color="Kategori",
-        orientation='h',
-        color_discrete_map=color_sentimen,
-        text=cat_melt['Persentase'].apply(format_persen)
-    )
-    
-    fig.update_layout(
-        title="Persentase Sentimen per Pertanyaan",
-        xaxis_title="Persentase (%)",
-        height=600,
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
+    fig = dari_sesi(agregat, "fig_sentimen", buat_fig_sentimen, cat_per_q)
     st.plotly_chart(fig, use_container_width=True)
     
     # Chart 2: Total Agregat
@@ -361,14 +575,7 @@ elif menu == "🎭 Analisis Sentimen/Kategori":
         'Jumlah': [total_pos, total_neu, total_neg]
     })
     
-    fig_agg = px.bar(
-        df_agregat,
-        x="Kategori",
-        y="Jumlah",
-        color="Kategori",
-        color_discrete_map=color_sentimen,
-        text_auto=True
-    )
+    fig_agg = dari_sesi(agregat, "fig_agregat", buat_fig_agregat, df_agregat)
     st.plotly_chart(fig_agg, use_container_width=True)
 
 
@@ -381,11 +588,13 @@ elif menu == "📋 Tabel Data Lengkap":
     
     st.write(f"**Total Data:** {len(df)} Responden x {len(df.columns)} Pertanyaan")
     
-    # Tampilkan dataframe
-    st.dataframe(df_display, use_container_width=True, height=500)
+    # Tampilkan dataframe (dibatasi agar payload tidak membengkak; download tetap lengkap)
+    if len(df) > MAKS_BARIS_TABEL:
+        st.caption(f"Menampilkan {MAKS_BARIS_TABEL} dari {len(df)} baris. Gunakan tombol download untuk data lengkap.")
+    st.dataframe(df[list(kolom_terpilih)].head(MAKS_BARIS_TABEL), use_container_width=True, height=500)
     
     # Download Button
-    csv = df_display.to_csv(index=False).encode('utf-8')
+    csv = buat_csv(df, kolom_terpilih)
     st.download_button(
         label="📥 Download Data CSV",
         data=csv,